@@ -0,0 +1,183 @@
+from datetime import datetime, timezone, timedelta
+import numpy as np
+from sqlalchemy import select, func
+from models import Category, Goal
+from extensions import db
+from archive import goal_history
+from cache import LRUCache
+from dates import user_timezone, local_today, local_day_window, in_window
+
+HISTORY_DAYS = 365
+ROLLING_WINDOWS = (7, 30)
+# Per-(category, day) matrices: goals due that day, how many of those are completed,
+# and completions of goals without a deadline (counted on their completion day)
+CATEGORY_KEYS = ('cat_due', 'cat_completed', 'cat_undated')
+
+# Days before today rarely change, so their arrays are cached per user and local day.
+# Completing an overdue goal does change them (it counts on its deadline day), so the key
+# also carries a completion token. Today's counts are always read live and appended.
+_past_cache = LRUCache(maxsize=2048)
+
+def _day_boundaries(tz, start_date, days):
+    """UTC timestamps of every local midnight in the range (days + 1 values, DST-aware)."""
+    return np.array([
+        local_day_window(tz, start_date + timedelta(days=i))[0].timestamp()
+        for i in range(days + 1)
+    ])
+
+def _timestamps(datetimes):
+    return np.array([
+        (dt.replace(tzinfo=timezone.utc) if dt.tzinfo is None else dt).timestamp()
+        for dt in datetimes
+    ], dtype=np.float64)
+
+def _load_counts(user_id, tz, start_date, days):
+    """
+    Reads completions and deadlines for `days` local days once and returns dense arrays:
+    completed per day (any goal, by end_time), plus the CATEGORY_KEYS matrices.
+    Completion rates only use goals due in the range, so they never exceed 100%.
+    """
+    boundaries = _day_boundaries(tz, start_date, days)
+    window = (
+        datetime.fromtimestamp(boundaries[0], timezone.utc),
+        datetime.fromtimestamp(boundaries[-1], timezone.utc)
+    )
+    history = goal_history(user_id)
+
+    completed_rows = db.session.execute(
+        select(history.c.end_time, history.c.category_id, history.c.deadline.is_(None))
+            .where(history.c.status == 'completed', in_window(history.c.end_time, window))
+    ).all()
+    due_rows = db.session.execute(
+        select(history.c.deadline, history.c.category_id, history.c.status == 'completed')
+            .where(in_window(history.c.deadline, window))
+    ).all()
+    undated_rows = [r for r in completed_rows if r[2]]
+    due_completed_rows = [r for r in due_rows if r[2]]
+
+    def day_indexes(rows):
+        # Local day offset of each timestamp, found by binary search over the midnights
+        days_idx = np.searchsorted(boundaries, _timestamps(r[0] for r in rows), side='right') - 1
+        return np.clip(days_idx, 0, days - 1)
+
+    def category_ids(rows):
+        # 0 stands for "General" (uncategorized); real ids start at 1
+        return np.array([r[1] or 0 for r in rows], dtype=np.int64)
+
+    groups = {'cat_due': due_rows, 'cat_completed': due_completed_rows, 'cat_undated': undated_rows}
+    cat_ids = np.union1d(category_ids(due_rows), category_ids(undated_rows))
+
+    arrays = {
+        'completed': np.bincount(day_indexes(completed_rows), minlength=days).astype(np.int64),
+        'cat_ids': cat_ids
+    }
+    for key, rows in groups.items():
+        matrix = np.zeros((cat_ids.size, days), dtype=np.int64)
+        np.add.at(matrix, (np.searchsorted(cat_ids, category_ids(rows)), day_indexes(rows)), 1)
+        arrays[key] = matrix
+    return arrays
+
+def _concat(first, second):
+    """Joins two consecutive day ranges, aligning their category rows."""
+    cat_ids = np.union1d(first['cat_ids'], second['cat_ids'])
+
+    def aligned(part, key):
+        out = np.zeros((cat_ids.size, part[key].shape[1]), dtype=np.int64)
+        out[np.searchsorted(cat_ids, part['cat_ids'])] = part[key]
+        return out
+
+    arrays = {'completed': np.concatenate([first['completed'], second['completed']]), 'cat_ids': cat_ids}
+    for key in CATEGORY_KEYS:
+        arrays[key] = np.hstack([aligned(first, key), aligned(second, key)])
+    return arrays
+
+def _merge_unknown_categories(arrays, names):
+    """Folds rows of categories that no longer exist (deleted since caching) into General (id 0)."""
+    ids = np.array([c if c in names else 0 for c in arrays['cat_ids'].tolist()], dtype=np.int64)
+    cat_ids, rows = np.unique(ids, return_inverse=True)
+    if cat_ids.size == ids.size:
+        return arrays
+
+    def merged(key):
+        out = np.zeros((cat_ids.size, arrays[key].shape[1]), dtype=np.int64)
+        np.add.at(out, rows, arrays[key])
+        return out
+
+    return dict(arrays, cat_ids=cat_ids, **{key: merged(key) for key in CATEGORY_KEYS})
+
+def compute_streaks(counts):
+    """
+    Returns (current, longest) runs of days with at least one completion.
+    The current streak is still alive if today has nothing done yet but yesterday did.
+    """
+    active = np.concatenate(([0], (counts > 0).astype(np.int8), [0]))
+    edges = np.flatnonzero(np.diff(active))
+    run_starts, run_ends = edges[::2], edges[1::2]
+    if run_ends.size == 0:
+        return 0, 0
+
+    lengths = run_ends - run_starts
+    current = int(lengths[-1]) if run_ends[-1] >= counts.size - 1 else 0
+    return current, int(lengths.max())
+
+def rolling_sums(counts, window):
+    """Trailing `window`-day totals for each day (shorter windows at the start)."""
+    return np.convolve(counts, np.ones(window, dtype=np.int64))[:counts.size]
+
+def weekly_totals(matrix, pad):
+    """Sums (rows, days) into (rows, weeks); `pad` empty days go in front so weeks end today."""
+    padded = np.pad(matrix, ((0, 0), (pad, 0)))
+    return padded.reshape(matrix.shape[0], padded.shape[1] // 7, 7).sum(axis=2)
+
+def history_stats(user, days=HISTORY_DAYS):
+    """
+    Year-long heatmap, streaks, rolling totals and weekly per-category completion rates.
+    Per week: `due` goals, `completed` of those, `rate` = completed / due, and `undated`
+    completions of goals without a deadline (not part of the rate).
+    """
+    tz = user_timezone(user)
+    today = local_today(tz)
+    start = today - timedelta(days=days - 1)
+
+    completion_token = db.session.execute(
+        select(func.count(), func.max(Goal.end_time)).where(Goal.user_id == user.id, Goal.status == 'completed')
+    ).one()
+    cache_key = (user.id, tz.zone, today.isoformat(), days, tuple(completion_token))
+    past = _past_cache.get(cache_key)
+    if past is None:
+        past = _load_counts(user.id, tz, start, days - 1)
+        _past_cache.set(cache_key, past)
+    arrays = _concat(past, _load_counts(user.id, tz, today, 1))
+    names = dict(db.session.execute(select(Category.id, Category.name).where(Category.user_id == user.id)).all())
+    arrays = _merge_unknown_categories(arrays, names)
+
+    counts = arrays['completed']
+    current_streak, longest_streak = compute_streaks(counts)
+
+    # Weekly category series
+    pad = -days % 7
+    week_starts = [start + timedelta(days=7 * i - pad) for i in range((days + pad) // 7)]
+    weekly_completed = weekly_totals(arrays['cat_completed'], pad)
+    weekly_due = weekly_totals(arrays['cat_due'], pad)
+    weekly_undated = weekly_totals(arrays['cat_undated'], pad)
+    rates = np.divide(
+        weekly_completed, weekly_due,
+        out=np.zeros(weekly_due.shape, dtype=np.float64), where=weekly_due > 0
+    )
+
+    series = []
+    for row, cat_id in enumerate(arrays['cat_ids'].tolist()):
+        series.append({
+            'name': names.get(cat_id, 'General'),
+            'completed': weekly_completed[row].tolist(),
+            'due': weekly_due[row].tolist(),
+            'rate': np.round(rates[row] * 100, 1).tolist(),
+            'undated': weekly_undated[row].tolist()
+        })
+
+    return {
+        'heatmap': {'start': start.isoformat(), 'end': today.isoformat(), 'counts': counts.tolist()},
+        'streaks': {'current': current_streak, 'longest': longest_streak},
+        'rolling': {f'{w}d': rolling_sums(counts, w).tolist() for w in ROLLING_WINDOWS},
+        'categories': {'weeks': [w.isoformat() for w in week_starts], 'series': series}
+    }
@@ -1,13 +1,20 @@
 from flask import Flask
-from extensions import db, login_manager, csrf
+import click
+from extensions import db, login_manager, csrf, ai_guard
 from models import User
 import os
 from dotenv import load_dotenv
-import pytz
+from dates import to_local, user_timezone
 from flask_login import current_user
 from routes.auth import auth_bp
 from routes.main import main_bp
 from routes.api import api_bp
+from archive import archive_old_goals
+from utils import ensure_occurrence_index
+from responses import init_responses
+from cache import FragmentCacheExtension
+from routing import init_routing, REPLICA_BIND
+from reminders import ReminderScheduler, NOTIFIERS, rebuild_reminders
 
 load_dotenv()
 
@@ -24,34 +31,91 @@ def create_app():
     else:
         app.config['SQLALCHEMY_DATABASE_URI'] = database_url
 
+    # Optional read replica for heavy read-only endpoints
+    replica_url = os.getenv('REPLICA_DATABASE_URL')
+    if replica_url:
+        if replica_url.startswith("postgres://"):
+            replica_url = replica_url.replace("postgres://", "postgresql://", 1)
+        app.config['SQLALCHEMY_BINDS'] = {REPLICA_BIND: replica_url}
+    # After a write, the user reads from the primary for this long (read-your-writes)
+    app.config['REPLICA_STICKY_SECONDS'] = float(os.getenv('REPLICA_STICKY_SECONDS', 10))
+    # Deadline reminders: "due soon" fires this many hours before the deadline
+    app.config['REMINDER_LEAD_HOURS'] = float(os.getenv('REMINDER_LEAD_HOURS', 24))
+    app.config['REMINDER_NOTIFIER'] = os.getenv('REMINDER_NOTIFIER', 'console')
+
     app.config['SECRET_KEY'] = os.getenv('SECRET_KEY')
     app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    # Completed/archived goals older than this move to the `goal_archive` table
+    app.config['GOAL_ARCHIVE_AFTER_DAYS'] = int(os.getenv('GOAL_ARCHIVE_AFTER_DAYS', 30))
+    # AI chat limits: per-user token bucket + global cap on concurrent Gemini calls
+    app.config['AI_RATE_PER_MINUTE'] = float(os.getenv('AI_RATE_PER_MINUTE', 6))
+    app.config['AI_BURST'] = int(os.getenv('AI_BURST', 3))
+    app.config['AI_MAX_QUEUE_WAIT'] = float(os.getenv('AI_MAX_QUEUE_WAIT', 10))
+    app.config['AI_MAX_CONCURRENCY'] = int(os.getenv('AI_MAX_CONCURRENCY', 2))
+    # Requests allowed to wait for a token / slot; keep concurrency + waiting well below gunicorn --threads
+    app.config['AI_MAX_WAITING'] = int(os.getenv('AI_MAX_WAITING', 2))
 
     # 2. Initialize Extensions
     db.init_app(app)
     login_manager.init_app(app)
     login_manager.login_view = 'auth.login'
     csrf.init_app(app)
+    ai_guard.init_app(app)
+    init_routing(app)
+    init_responses(app)
 
     # 3. Register Blueprints
     app.register_blueprint(auth_bp)
     app.register_blueprint(main_bp)
     app.register_blueprint(api_bp)
 
-    # 4. Template Filters
+    # 4. Templates: fragment cache ({% cache key %}) and filters
+    app.jinja_env.add_extension(FragmentCacheExtension)
+
     @app.template_filter('to_local_time')
     def to_local_time_filter(dt):
         if dt is None: return ""
-        user_tz = pytz.timezone(current_user.timezone)
-        local_dt = dt.astimezone(user_tz)
+        local_dt = to_local(dt, user_timezone(current_user))
         return local_dt.strftime('%Y-%m-%d %I:%M %p')
 
     @app.template_filter('to_local_time_form')
     def to_local_time_form_filter(dt):
         if dt is None: return ""
-        user_tz = pytz.timezone(current_user.timezone)
-        local_dt = dt.astimezone(user_tz)
+        local_dt = to_local(dt, user_timezone(current_user))
         return local_dt.strftime('%Y-%m-%dT%H:%M')
+
+    # 5. CLI Commands
+    @app.cli.command('archive-goals')
+    @click.option('--days', type=int, default=None, help='Archive goals finished more than N days ago.')
+    def archive_goals_command(days):
+        """Move old completed/archived goals into cold storage."""
+        if days is None:
+            days = app.config['GOAL_ARCHIVE_AFTER_DAYS']
+        moved = archive_old_goals(older_than_days=days)
+        click.echo(f"Archived {moved} goals finished more than {days} days ago.")
+
+    @app.cli.command('dedupe-occurrences')
+    def dedupe_occurrences_command():
+        """Remove duplicate recurring occurrences and add their unique index."""
+        removed, created = ensure_occurrence_index()
+        if created:
+            click.echo(f"Removed {removed} duplicate occurrences and created the unique index.")
+        else:
+            click.echo("The unique index already exists.")
+
+    @app.cli.command('run-reminders')
+    @click.option('--once', is_flag=True, help='Send what is due now and exit.')
+    @click.option('--interval', type=int, default=30, help='Seconds between ticks.')
+    @click.option('--rebuild', is_flag=True, help='Index reminders for existing goals first.')
+    def run_reminders_command(once, interval, rebuild):
+        """Send 'due soon' and 'overdue' reminders."""
+        if rebuild:
+            click.echo(f"Indexed {rebuild_reminders()} goals.")
+        scheduler = ReminderScheduler(NOTIFIERS[app.config['REMINDER_NOTIFIER']]())
+        if once:
+            click.echo(f"Sent {scheduler.tick()} reminders.")
+        else:
+            scheduler.run(interval)
     return app
 
 app = create_app()
@@ -0,0 +1,85 @@
+from datetime import datetime, timezone, timedelta
+from sqlalchemy import select, insert, delete, func, literal, union_all
+from models import Goal, GoalArchive, UTCDateTime
+from extensions import db
+
+# Statuses that are finished for good and can be moved to cold storage
+COLD_STATUSES = ('completed', 'archived')
+
+# Columns shared by the hot (`goal`) and cold (`goal_archive`) tables, besides the goal id
+SHARED_COLUMNS = (
+    'title', 'description', 'status', 'date_created', 'deadline',
+    'start_time', 'end_time', 'user_id', 'category_id', 'pattern_id'
+)
+
+def archive_old_goals(older_than_days=30, user_id=None, batch_size=500):
+    """
+    Moves goals that were completed or archived more than `older_than_days` ago
+    from the hot `goal` table into `goal_archive`.
+    Works in batches so a large backlog never holds one huge transaction.
+    Returns the number of goals moved.
+    """
+    now_utc = datetime.now(timezone.utc)
+    cutoff = now_utc - timedelta(days=older_than_days)
+
+    # Archived goals have no end_time, so fall back to the deadline / creation date
+    finished_at = func.coalesce(Goal.end_time, Goal.deadline, Goal.date_created)
+    criteria = [Goal.status.in_(COLD_STATUSES), finished_at < cutoff]
+    if user_id:
+        criteria.append(Goal.user_id == user_id)
+
+    hot_columns = [Goal.id] + [getattr(Goal, name) for name in SHARED_COLUMNS]
+    moved = 0
+
+    while True:
+        batch_ids = db.session.scalars(
+            select(Goal.id).where(*criteria).order_by(Goal.id).limit(batch_size)
+        ).all()
+        if not batch_ids:
+            break
+
+        # 1. Copy the batch into the cold table
+        db.session.execute(
+            insert(GoalArchive).from_select(
+                ['source_goal_id'] + list(SHARED_COLUMNS) + ['archived_at'],
+                select(*hot_columns, literal(now_utc, UTCDateTime(timezone=True)))
+                    .where(Goal.id.in_(batch_ids))
+            )
+        )
+
+        # 2. Remove it from the hot table
+        db.session.execute(
+            delete(Goal).where(Goal.id.in_(batch_ids)),
+            execution_options={'synchronize_session': False}
+        )
+        db.session.commit()
+        moved += len(batch_ids)
+
+    return moved
+
+def goal_history(user_id=None):
+    """
+    Returns a subquery over hot AND cold goals with the goal id and the shared columns.
+    Use it for history and statistics; active views should keep querying `Goal`.
+
+        history = goal_history(user_id)
+        db.session.query(func.count()).select_from(history).scalar()
+    """
+    hot = select(Goal.id, *[getattr(Goal, name) for name in SHARED_COLUMNS])
+    cold = select(GoalArchive.source_goal_id.label('id'), *[getattr(GoalArchive, name) for name in SHARED_COLUMNS])
+
+    # Filter inside each branch so both tables can use their user_id index
+    if user_id:
+        hot = hot.where(Goal.user_id == user_id)
+        cold = cold.where(GoalArchive.user_id == user_id)
+
+    return union_all(hot, cold).subquery('goal_history')
+
+def latest_occurrence(pattern_id):
+    """Returns the latest deadline generated by a pattern, looking at both tables."""
+    deadlines = [
+        db.session.query(func.max(Goal.deadline)).filter(Goal.pattern_id == pattern_id).scalar(),
+        db.session.query(func.max(GoalArchive.deadline)).filter(GoalArchive.pattern_id == pattern_id).scalar()
+    ]
+    deadlines = [d for d in deadlines if d is not None]
+    return max(deadlines) if deadlines else None
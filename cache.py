@@ -0,0 +1,61 @@
+from collections import OrderedDict
+import threading
+from jinja2 import nodes
+from jinja2.ext import Extension
+
+class LRUCache:
+    """
+    A small thread-safe, in-process LRU cache.
+    Each gunicorn worker keeps its own copy, so only cache values that are
+    cheap to rebuild and that encode their own freshness in the key.
+    """
+
+    def __init__(self, maxsize=1024):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            if key not in self._data:
+                return default
+            self._data.move_to_end(key)
+            return self._data[key]
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+class FragmentCacheExtension(Extension):
+    """
+    Jinja tag that caches a rendered block in `environment.fragment_cache`:
+
+        {% cache ('sidebar', current_user.id, version) %} ... {% endcache %}
+
+    Put everything the block depends on (user, data version) into the key.
+    """
+    tags = {'cache'}
+
+    def __init__(self, environment):
+        super().__init__(environment)
+        environment.extend(fragment_cache=LRUCache(maxsize=4096))
+
+    def parse(self, parser):
+        lineno = next(parser.stream).lineno
+        key = parser.parse_expression()
+        body = parser.parse_statements(['name:endcache'], drop_needle=True)
+        return nodes.CallBlock(self.call_method('_cache_support', [key]), [], [], body).set_lineno(lineno)
+
+    def _cache_support(self, key, caller):
+        cached = self.environment.fragment_cache.get(key)
+        if cached is None:
+            cached = caller()
+            self.environment.fragment_cache.set(key, cached)
+        return cached
@@ -0,0 +1,49 @@
+from datetime import datetime, timezone, timedelta, time
+from sqlalchemy import and_
+import pytz
+
+def user_timezone(user):
+    """Returns the user's pytz timezone, falling back to UTC for unknown names."""
+    try:
+        return pytz.timezone(user.timezone or 'UTC')
+    except pytz.UnknownTimeZoneError:
+        return pytz.utc
+
+def to_local(dt, tz):
+    """Converts a stored datetime to the user's timezone (naive values are UTC)."""
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return dt.astimezone(tz)
+
+def local_today(tz):
+    return datetime.now(timezone.utc).astimezone(tz).date()
+
+def local_day_window(tz, start_date, end_date=None):
+    """
+    Turns user-local dates into half-open UTC bounds [start, end).
+    `end_date` is exclusive and defaults to the day after `start_date`,
+    so a single date gives that whole local day.
+    """
+    if end_date is None:
+        end_date = start_date + timedelta(days=1)
+
+    start = tz.localize(datetime.combine(start_date, time.min)).astimezone(timezone.utc)
+    end = tz.localize(datetime.combine(end_date, time.min)).astimezone(timezone.utc)
+    return start, end
+
+def in_window(column, window):
+    """
+    Range filter on a bare column, so an index on it can be used
+    (unlike wrapping the column in func.date()).
+    """
+    start, end = window
+    return and_(column >= start, column < end)
+
+def bucket_by_local_day(datetimes, tz, start_date, days):
+    """Counts datetimes per local day for `days` days starting at `start_date`."""
+    counts = [0] * days
+    for dt in datetimes:
+        index = (to_local(dt, tz).date() - start_date).days
+        if 0 <= index < days:
+            counts[index] += 1
+    return counts
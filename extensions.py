@@ -1,7 +1,11 @@
 from flask_sqlalchemy import SQLAlchemy
 from flask_login import LoginManager
 from flask_wtf.csrf import CSRFProtect
+from throttling import AICallGuard
+from routing import RoutingSession
 
-db = SQLAlchemy()
+# Read-only endpoints can be routed to a replica (see routing.py)
+db = SQLAlchemy(session_options={'class_': RoutingSession})
 login_manager = LoginManager()
-csrf = CSRFProtect()
\ No newline at end of file
+csrf = CSRFProtect()
+ai_guard = AICallGuard()
\ No newline at end of file
@@ -3,6 +3,25 @@ from flask_login import UserMixin
 from datetime import datetime, timezone
 from sqlalchemy.orm import joinedload
 
+class UTCDateTime(db.TypeDecorator):
+    """
+    DateTime that always stores and returns UTC.
+    SQLite drops the offset, so aware values are converted to UTC before saving
+    and naive values read back are marked as UTC.
+    """
+    impl = db.DateTime
+    cache_ok = True
+
+    def process_bind_param(self, value, dialect):
+        if value is not None and value.tzinfo is not None:
+            value = value.astimezone(timezone.utc)
+        return value
+
+    def process_result_value(self, value, dialect):
+        if value is not None and value.tzinfo is None:
+            value = value.replace(tzinfo=timezone.utc)
+        return value
+
 class User(db.Model, UserMixin):
     id = db.Column(db.Integer, primary_key=True)
     username = db.Column(db.String(20), unique=True, nullable=False)
@@ -19,13 +38,23 @@ class Category(db.Model):
     goals = db.relationship('Goal', backref='category', lazy=True)
     patterns = db.relationship('RecurringPattern', backref='category', lazy=True)
 
+    @classmethod
+    def version_for(cls, user_id):
+        """
+        Fingerprint of a user's category list, used as a cache key.
+        Hashes the (id, name) rows themselves: (count, max id) is not enough because
+        SQLite hands a deleted category's id to the next one.
+        """
+        rows = db.session.query(cls.id, cls.name).filter(cls.user_id == user_id).order_by(cls.id).all()
+        return hash(tuple(map(tuple, rows)))
+
 class RecurringPattern(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     title = db.Column(db.String(100), nullable=False)
     description = db.Column(db.Text, nullable=True)
     frequency = db.Column(db.String(20), nullable=False) # 'daily', 'weekly', 'monthly'
     # This acts as the 'Start Date' and the 'Anchor Time'
-    anchor_date = db.Column(db.DateTime(timezone=True), nullable=False)
+    anchor_date = db.Column(UTCDateTime(timezone=True), nullable=False)
     
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     category_id = db.Column(db.Integer, db.ForeignKey('category.id'), nullable=True)
@@ -35,14 +64,19 @@ class RecurringPattern(db.Model):
     goals = db.relationship('Goal', backref='pattern', lazy=True)
 
 class Goal(db.Model):
+    # A pattern can only produce one occurrence per deadline (see utils.upsert_occurrences)
+    __table_args__ = (
+        db.UniqueConstraint('pattern_id', 'deadline', name='uq_goal_pattern_deadline'),
+    )
+
     id = db.Column(db.Integer, primary_key = True)
     title = db.Column(db.String(100), nullable=False)
     description = db.Column(db.Text, nullable=True)
     status = db.Column(db.String(20), default = "pending")
-    date_created = db.Column(db.DateTime(timezone=True), default=lambda: datetime.now(timezone.utc))
-    deadline = db.Column(db.DateTime(timezone=True))
-    start_time = db.Column(db.DateTime(timezone=True))
-    end_time = db.Column(db.DateTime(timezone=True))
+    date_created = db.Column(UTCDateTime(timezone=True), default=lambda: datetime.now(timezone.utc))
+    deadline = db.Column(UTCDateTime(timezone=True))
+    start_time = db.Column(UTCDateTime(timezone=True))
+    end_time = db.Column(UTCDateTime(timezone=True))
     
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     category_id = db.Column(db.Integer, db.ForeignKey('category.id'), nullable=True)
@@ -79,4 +113,44 @@ class Goal(db.Model):
 
         query = query.options(joinedload(cls.category))
 
-        return query.paginate(page=page, per_page=per_page, error_out=False)
\ No newline at end of file
+        return query.paginate(page=page, per_page=per_page, error_out=False)
+
+class GoalArchive(db.Model):
+    """
+    Cold storage for goals that were completed or archived long ago.
+    `source_goal_id` is the id the row had in the `goal` table. It is not unique:
+    SQLite reuses the highest goal id once that goal has been moved here.
+    """
+    __tablename__ = 'goal_archive'
+
+    id = db.Column(db.Integer, primary_key=True)
+    source_goal_id = db.Column(db.Integer, nullable=False, index=True)
+    title = db.Column(db.String(100), nullable=False)
+    description = db.Column(db.Text, nullable=True)
+    status = db.Column(db.String(20), nullable=False)
+    date_created = db.Column(UTCDateTime(timezone=True))
+    deadline = db.Column(UTCDateTime(timezone=True))
+    start_time = db.Column(UTCDateTime(timezone=True))
+    end_time = db.Column(UTCDateTime(timezone=True))
+    archived_at = db.Column(UTCDateTime(timezone=True), default=lambda: datetime.now(timezone.utc))
+
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False, index=True)
+    category_id = db.Column(db.Integer, db.ForeignKey('category.id'), nullable=True)
+    pattern_id = db.Column(db.Integer, db.ForeignKey('recurring_pattern.id'), nullable=True, index=True)
+
+
+class GoalReminder(db.Model):
+    """
+    Persistent next-due index for deadline reminders (maintained by reminders.py).
+    One row per goal with a deadline that is still pending or in progress.
+    `stage` is the next reminder to send: 'due_soon', 'overdue', or 'done'.
+    """
+    __tablename__ = 'goal_reminder'
+
+    # No foreign key: reminders are re-validated against `goal` before firing
+    goal_id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    user_id = db.Column(db.Integer, nullable=False)
+    deadline = db.Column(UTCDateTime(timezone=True), nullable=False)
+    stage = db.Column(db.String(20), nullable=False)
+    next_fire_at = db.Column(UTCDateTime(timezone=True), nullable=True, index=True)
+    updated_at = db.Column(UTCDateTime(timezone=True), nullable=False, index=True)
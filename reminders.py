@@ -0,0 +1,266 @@
+import heapq
+import time
+from datetime import datetime, timezone, timedelta
+from flask import current_app, has_app_context
+from sqlalchemy import select, delete, update, insert, event, inspect, tuple_
+from models import Goal, GoalReminder
+from extensions import db
+from routing import RoutingSession
+
+ACTIVE_STATUSES = ('pending', 'in_progress')
+DEFAULT_LEAD_HOURS = 24
+
+# ---------------------------------------------------------
+#  NOTIFIERS
+# ---------------------------------------------------------
+
+class Notifier:
+    """Receives batches of reminder events. Subclass and override `send`."""
+
+    def send(self, events):
+        raise NotImplementedError
+
+class ConsoleNotifier(Notifier):
+    def send(self, events):
+        for e in events:
+            print(f"[{e['kind']}] user={e['user_id']} goal={e['goal_id']} \"{e['title']}\" due {e['deadline'].isoformat()}")
+
+class MemoryNotifier(Notifier):
+    """Local stand-in that just keeps every batch (for tests and development)."""
+
+    def __init__(self):
+        self.batches = []
+
+    def send(self, events):
+        self.batches.append(list(events))
+
+    @property
+    def events(self):
+        return [e for batch in self.batches for e in batch]
+
+NOTIFIERS = {'console': ConsoleNotifier, 'memory': MemoryNotifier}
+
+# ---------------------------------------------------------
+#  NEXT-DUE INDEX MAINTENANCE
+# ---------------------------------------------------------
+
+def _as_utc(dt):
+    return dt.replace(tzinfo=timezone.utc) if dt.tzinfo is None else dt
+
+def _lead_time():
+    hours = current_app.config.get('REMINDER_LEAD_HOURS', DEFAULT_LEAD_HOURS) if has_app_context() else DEFAULT_LEAD_HOURS
+    return timedelta(hours=hours)
+
+def _first_stage(deadline, now):
+    """A fresh reminder starts with 'due soon' `lead` before the deadline, or 'overdue' if already late."""
+    if deadline <= now:
+        return 'overdue', now
+    return 'due_soon', deadline - _lead_time()
+
+def sync_reminders(connection, goals, now=None):
+    """
+    Brings the reminder rows for `goals` up to date.
+    `goals` is a list of (id, user_id, deadline, status); pass status=None for deleted goals.
+    Rows whose deadline did not change keep their progress, so an edit never re-sends
+    a reminder that already went out.
+    """
+    if not goals:
+        return
+    now = now or datetime.now(timezone.utc)
+    goal_ids = [g[0] for g in goals]
+
+    existing = dict(connection.execute(
+        select(GoalReminder.goal_id, GoalReminder.deadline).where(GoalReminder.goal_id.in_(goal_ids))
+    ).all())
+
+    stale_ids, inserts, updates = [], [], []
+    for goal_id, user_id, deadline, status in goals:
+        if status not in ACTIVE_STATUSES or deadline is None:
+            if goal_id in existing:
+                stale_ids.append(goal_id)
+            continue
+
+        deadline = _as_utc(deadline)
+        if goal_id in existing and _as_utc(existing[goal_id]) == deadline:
+            continue
+
+        stage, fire_at = _first_stage(deadline, now)
+        row = {'goal_id': goal_id, 'user_id': user_id, 'deadline': deadline,
+               'stage': stage, 'next_fire_at': fire_at, 'updated_at': now}
+        (updates if goal_id in existing else inserts).append(row)
+
+    if stale_ids:
+        connection.execute(delete(GoalReminder.__table__).where(GoalReminder.goal_id.in_(stale_ids)))
+    if inserts:
+        connection.execute(insert(GoalReminder.__table__), inserts)
+    for row in updates:
+        connection.execute(
+            update(GoalReminder.__table__).where(GoalReminder.goal_id == row['goal_id']).values(**row)
+        )
+
+def sync_goal_reminders(goal_ids):
+    """Syncs reminders for goals written with Core statements (e.g. upsert_occurrences)."""
+    if not goal_ids:
+        return
+    goals = db.session.execute(
+        select(Goal.id, Goal.user_id, Goal.deadline, Goal.status).where(Goal.id.in_(goal_ids))
+    ).all()
+    sync_reminders(db.session.connection(), goals)
+
+@event.listens_for(RoutingSession, 'after_flush')
+def _sync_after_flush(db_session, flush_context):
+    """Keeps the index in step with ORM changes, inside the same transaction."""
+    goals = []
+    for obj in db_session.new:
+        if isinstance(obj, Goal):
+            goals.append((obj.id, obj.user_id, obj.deadline, obj.status))
+    for obj in db_session.dirty:
+        if isinstance(obj, Goal):
+            state = inspect(obj)
+            if state.attrs.deadline.history.has_changes() or state.attrs.status.history.has_changes():
+                goals.append((obj.id, obj.user_id, obj.deadline, obj.status))
+    for obj in db_session.deleted:
+        if isinstance(obj, Goal):
+            goals.append((obj.id, obj.user_id, obj.deadline, None))
+
+    if goals:
+        sync_reminders(db_session.connection(), goals)
+
+def rebuild_reminders(batch_size=1000):
+    """One-off backfill for goals created before reminders existed. Pages by id."""
+    last_id, total = 0, 0
+    while True:
+        goals = db.session.execute(
+            select(Goal.id, Goal.user_id, Goal.deadline, Goal.status)
+                .where(Goal.id > last_id, Goal.status.in_(ACTIVE_STATUSES), Goal.deadline.isnot(None))
+                .order_by(Goal.id).limit(batch_size)
+        ).all()
+        if not goals:
+            return total
+        sync_reminders(db.session.connection(), goals)
+        db.session.commit()
+        last_id = goals[-1][0]
+        total += len(goals)
+
+# ---------------------------------------------------------
+#  SCHEDULER
+# ---------------------------------------------------------
+
+class ReminderScheduler:
+    """
+    Fires reminders from an in-memory min-heap of (fire_at, goal_id, stage).
+    Only reminders due within `lookahead` are held in memory. The heap is filled
+    incrementally: new time windows as the clock moves, plus rows whose
+    `updated_at` moved since the last poll. So a tick costs O(changes + due),
+    not a scan of every pending goal.
+    Heap entries may be stale; each due batch is re-checked against the database.
+    """
+
+    # Overlap when polling `updated_at`, for transactions that commit late
+    POLL_OVERLAP = timedelta(seconds=5)
+
+    def __init__(self, notifier, lookahead=timedelta(hours=1), batch_size=500):
+        self.notifier = notifier
+        self.lookahead = lookahead
+        self.batch_size = batch_size
+        self.heap = []
+        self.queued = set()
+        self.loaded_until = None
+        self.last_poll = None
+
+    def _push(self, goal_id, stage, fire_at):
+        key = (goal_id, stage, _as_utc(fire_at).timestamp())
+        if key not in self.queued:
+            self.queued.add(key)
+            heapq.heappush(self.heap, (key[2], goal_id, stage))
+
+    def _load(self, now):
+        horizon = now + self.lookahead
+        columns = (GoalReminder.goal_id, GoalReminder.stage, GoalReminder.next_fire_at)
+        due_before_horizon = GoalReminder.next_fire_at < horizon
+
+        if self.loaded_until is None:
+            # First run: everything already due or due within the lookahead
+            query = select(*columns).where(due_before_horizon)
+        else:
+            # The newly uncovered time window, plus rows changed since the last poll
+            new_window = GoalReminder.next_fire_at >= self.loaded_until
+            changed = GoalReminder.updated_at >= self.last_poll - self.POLL_OVERLAP
+            query = select(*columns).where(due_before_horizon, new_window | changed)
+
+        result = db.session.execute(query.execution_options(yield_per=self.batch_size))
+        for goal_id, stage, fire_at in result:
+            self._push(goal_id, stage, fire_at)
+
+        self.loaded_until = horizon
+        self.last_poll = now
+
+    def _pop_due(self, now):
+        due = []
+        while self.heap and self.heap[0][0] <= now.timestamp() and len(due) < self.batch_size:
+            fire_ts, goal_id, stage = heapq.heappop(self.heap)
+            self.queued.discard((goal_id, stage, fire_ts))
+            due.append((goal_id, stage, fire_ts))
+        return due
+
+    def _fire(self, due, now):
+        """Re-validates a batch, sends its events and advances each reminder's stage."""
+        rows = db.session.execute(
+            select(GoalReminder.goal_id, GoalReminder.user_id, GoalReminder.stage,
+                   GoalReminder.next_fire_at, GoalReminder.deadline, Goal.title)
+                .join(Goal, Goal.id == GoalReminder.goal_id)
+                .where(
+                    tuple_(GoalReminder.goal_id, GoalReminder.stage).in_([(g, s) for g, s, _ in due]),
+                    Goal.status.in_(ACTIVE_STATUSES)
+                )
+        ).all()
+        fire_times = {(g, s): ts for g, s, ts in due}
+
+        events, advances = [], []
+        for goal_id, user_id, stage, next_fire_at, deadline, title in rows:
+            # Skip entries that were rescheduled after they were queued
+            if next_fire_at is None or _as_utc(next_fire_at).timestamp() != fire_times[(goal_id, stage)]:
+                continue
+
+            deadline = _as_utc(deadline)
+            if stage == 'due_soon' and deadline <= now:
+                # The deadline passed before we got here: skip straight to overdue
+                stage = 'overdue'
+
+            events.append({'kind': stage, 'goal_id': goal_id, 'user_id': user_id,
+                           'title': title, 'deadline': deadline})
+            if stage == 'due_soon':
+                advances.append({'goal_id': goal_id, 'stage': 'overdue', 'next_fire_at': deadline, 'updated_at': now})
+            else:
+                advances.append({'goal_id': goal_id, 'stage': 'done', 'next_fire_at': None, 'updated_at': now})
+
+        if events:
+            # At-least-once: notify first, then record the progress
+            self.notifier.send(events)
+            db.session.execute(update(GoalReminder), advances)
+            db.session.commit()
+
+            for row in advances:
+                if row['next_fire_at'] is not None and row['next_fire_at'] < self.loaded_until:
+                    self._push(row['goal_id'], row['stage'], row['next_fire_at'])
+        else:
+            db.session.rollback()
+
+        return len(events)
+
+    def tick(self, now=None):
+        """Loads changes, then fires everything that is due. Returns the number of events sent."""
+        now = now or datetime.now(timezone.utc)
+        self._load(now)
+
+        sent = 0
+        while True:
+            due = self._pop_due(now)
+            if not due:
+                return sent
+            sent += self._fire(due, now)
+
+    def run(self, interval=30):
+        while True:
+            self.tick()
+            time.sleep(interval)
@@ -0,0 +1,82 @@
+import gzip
+import hashlib
+import os
+from flask import request
+
+# Brotli is optional: without it we fall back to gzip
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+COMPRESSIBLE_MIMETYPES = ('application/json', 'text/html')
+# A year: fingerprinted static URLs change whenever the file does
+STATIC_MAX_AGE = 31536000
+
+def _choose_encoding():
+    offered = ['br', 'gzip'] if brotli else ['gzip']
+    return request.accept_encodings.best_match(offered)
+
+def compress_response(response, min_size):
+    """Compresses JSON/HTML bodies above `min_size` bytes with brotli or gzip."""
+    if (response.status_code < 200 or response.status_code in (204, 304)
+            or response.direct_passthrough or response.is_streamed
+            or 'Content-Encoding' in response.headers
+            or response.mimetype not in COMPRESSIBLE_MIMETYPES):
+        return response
+
+    data = response.get_data()
+    if len(data) < min_size:
+        return response
+
+    response.vary.add('Accept-Encoding')
+    encoding = _choose_encoding()
+    if encoding == 'br':
+        response.set_data(brotli.compress(data, quality=5))
+    elif encoding == 'gzip':
+        response.set_data(gzip.compress(data, compresslevel=6))
+    else:
+        return response
+
+    response.headers['Content-Encoding'] = encoding
+    return response
+
+def init_responses(app):
+    """Registers response compression and fingerprinted, long-cached static URLs."""
+    app.config.setdefault('COMPRESS_MIN_SIZE', int(os.getenv('COMPRESS_MIN_SIZE', 1024)))
+    fingerprints = {}
+
+    def static_fingerprint(filename):
+        # Keyed by mtime so an edited file gets a new hash without a restart
+        path = os.path.join(app.static_folder, filename)
+        try:
+            mtime = os.path.getmtime(path)
+        except OSError:
+            return None
+
+        cached = fingerprints.get(filename)
+        if cached and cached[0] == mtime:
+            return cached[1]
+
+        with open(path, 'rb') as f:
+            digest = hashlib.md5(f.read()).hexdigest()[:12]
+        fingerprints[filename] = (mtime, digest)
+        return digest
+
+    @app.url_defaults
+    def add_static_fingerprint(endpoint, values):
+        # url_for('static', filename='dashboard.js') -> /static/dashboard.js?v=<hash>
+        if endpoint == 'static' and 'filename' in values and 'v' not in values:
+            digest = static_fingerprint(values['filename'])
+            if digest:
+                values['v'] = digest
+
+    @app.after_request
+    def optimize_response(response):
+        if request.endpoint == 'static' and request.args.get('v'):
+            response.cache_control.no_cache = None
+            response.cache_control.public = True
+            response.cache_control.max_age = STATIC_MAX_AGE
+            response.cache_control.immutable = True
+            return response
+        return compress_response(response, app.config['COMPRESS_MIN_SIZE'])
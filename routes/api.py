@@ -1,7 +1,14 @@
-from flask import Blueprint, jsonify, request, url_for
+from flask import Blueprint, jsonify, request, url_for, Response, stream_with_context
 from flask_login import login_required, current_user
-from models import Goal, RecurringPattern, Category
-from extensions import db
+from models import Goal, RecurringPattern, Category, GoalArchive
+from extensions import db, ai_guard
+from throttling import RateLimited, UpstreamBusy
+from routing import read_only
+from archive import goal_history
+from analytics import history_stats
+from dates import user_timezone, to_local, local_today, local_day_window, in_window, bucket_by_local_day
+from utils import upsert_occurrences
+from transfer import iter_export_records, generate_ndjson, generate_csv, iter_ndjson, iter_csv, GoalImporter
 from datetime import datetime, timezone, timedelta
 from sqlalchemy import or_, case, and_, func, text
 import os
@@ -9,19 +16,30 @@ from google import genai
 
 api_bp = Blueprint('api', __name__)
 
+# Stand-in goal id for building URL templates; the client swaps '{id}' back in
+URL_ID_PLACEHOLDER = 987654321
+
 @api_bp.route('/api/goals', methods=['GET'])
 @login_required
+@read_only
 def get_goals():
     query = Goal.query.filter_by(user_id=current_user.id)
+    user_tz = user_timezone(current_user)
 
-    # 1. Date Filter
+    # 1. Date Filter (a local day, or a local [start, end) range for the calendar)
     date_str = request.args.get('date')
-    if date_str:
-        try:
+    start_str = request.args.get('start')
+    end_str = request.args.get('end')
+    try:
+        if date_str:
             target_date = datetime.strptime(date_str, '%Y-%m-%d').date()
-            query = query.filter(db.func.date(Goal.deadline) == target_date)
-        except ValueError:
-            pass 
+            query = query.filter(in_window(Goal.deadline, local_day_window(user_tz, target_date)))
+        elif start_str and end_str:
+            start_date = datetime.strptime(start_str, '%Y-%m-%d').date()
+            end_date = datetime.strptime(end_str, '%Y-%m-%d').date()
+            query = query.filter(in_window(Goal.deadline, local_day_window(user_tz, start_date, end_date)))
+    except ValueError:
+        pass 
 
     # 2. Status Filter
     status = request.args.get('status')
@@ -73,31 +91,27 @@ def get_goals():
     results = []
     
     for goal in goals:
+        local_deadline = to_local(goal.deadline, user_tz) if goal.deadline else None
         computed_status = goal.status
         if goal.deadline and goal.deadline < now_utc and goal.status == 'pending':
             computed_status = 'overdue'
 
-        # Colors for Dots
-        dot_color = '#3788d8'
-        if computed_status == 'completed': dot_color = '#198754'
-        if computed_status == 'overdue': dot_color = '#dc3545'
-        if computed_status == 'in_progress': dot_color = '#ffc107'
-
         results.append({
             'id': goal.id,
             'title': goal.title,
             'description': goal.description,
             'status': computed_status,
-            'deadline_pretty': goal.deadline.strftime('%Y-%m-%d %I:%M %p') if goal.deadline else "No Deadline",
+            'deadline_pretty': local_deadline.strftime('%Y-%m-%d %I:%M %p') if local_deadline else "No Deadline",
             'category': goal.category.name if goal.category else None,
             'is_recurring': bool(goal.pattern_id),
-            'urls': {'edit': url_for('main.edit_goal', goal_id=goal.id)},
-            'start': goal.deadline.isoformat() if goal.deadline else None,
-            'color': dot_color,
-            'display': 'list-item' 
+            'start': local_deadline.isoformat() if local_deadline else None
         })
 
-    return jsonify(results)
+    # Values that are the same for every row are sent once instead of per goal
+    legend = {
+        'edit_url': url_for('main.edit_goal', goal_id=URL_ID_PLACEHOLDER).replace(str(URL_ID_PLACEHOLDER), '{id}')
+    }
+    return jsonify({'legend': legend, 'goals': results})
 
 @api_bp.route('/api/goals/create', methods=['POST'])
 @login_required
@@ -117,9 +131,11 @@ def create_goal_api():
     deadline = None
     if deadline_str:
         try:
-            deadline = datetime.strptime(deadline_str, '%Y-%m-%dT%H:%M')
+            naive_dt = datetime.strptime(deadline_str, '%Y-%m-%dT%H:%M')
         except ValueError:
             return jsonify({'error': 'Invalid date format'}), 400
+        # The form sends the user's wall-clock time; store it as UTC
+        deadline = user_timezone(current_user).localize(naive_dt).astimezone(timezone.utc)
 
     # Create Pattern (Logic borrowed from main.py)
     pattern = None
@@ -181,54 +197,51 @@ def create_category_api():
 
 @api_bp.route('/api/stats', methods=['GET'])
 @login_required
+@read_only
 def get_stats():
     user_id = current_user.id
+    # Statistics cover the full history: hot goals plus the archive
+    history = goal_history(user_id)
     
     # 1. KPIs
-    total = Goal.query.filter_by(user_id=user_id).count()
-    completed = Goal.query.filter_by(user_id=user_id, status='completed').count()
+    total = db.session.query(func.count()).select_from(history).scalar()
+    completed = db.session.query(func.count()).select_from(history)\
+        .filter(history.c.status == 'completed').scalar()
     win_rate = round((completed / total * 100), 1) if total > 0 else 0
 
     # 2. PIE CHART (Categories)
-    cat_stats = db.session.query(Category.name, func.count(Goal.id))\
-        .join(Goal, Goal.category_id == Category.id)\
-        .filter(Goal.user_id == user_id)\
+    cat_stats = db.session.query(Category.name, func.count(history.c.id))\
+        .join(history, history.c.category_id == Category.id)\
         .group_by(Category.name).all()
     
     pie_labels = [r[0] for r in cat_stats]
     pie_data = [r[1] for r in cat_stats]
     
     # Add "General" for uncategorized
-    uncategorized = Goal.query.filter_by(user_id=user_id, category_id=None).count()
+    uncategorized = db.session.query(func.count()).select_from(history)\
+        .filter(history.c.category_id.is_(None)).scalar()
     if uncategorized > 0:
         pie_labels.append("General")
         pie_data.append(uncategorized)
 
-    status_stats = db.session.query(Goal.status, func.count(Goal.id))\
-        .filter(Goal.user_id == user_id)\
-        .group_by(Goal.status).all()
+    status_stats = db.session.query(history.c.status, func.count(history.c.id))\
+        .group_by(history.c.status).all()
     
     status_labels = [r[0].replace('_', ' ').title() for r in status_stats] # "in_progress" -> "In Progress"
     status_data = [r[1] for r in status_stats]
 
-    # 3. BAR CHART (Last 7 Days Activity)
-    from datetime import timedelta
-    today = datetime.now(timezone.utc).date()
+    # 3. BAR CHART (Last 7 Days Activity, in the user's local days)
+    user_tz = user_timezone(current_user)
+    today = local_today(user_tz)
     seven_days_ago = today - timedelta(days=6)
+    window = local_day_window(user_tz, seven_days_ago, today + timedelta(days=1))
     
-    recent_activity = db.session.query(func.date(Goal.end_time), func.count(Goal.id))\
-        .filter(Goal.user_id == user_id, Goal.status == 'completed', Goal.end_time >= seven_days_ago)\
-        .group_by(func.date(Goal.end_time)).all()
+    # Plain range scan on end_time; bucketing happens in Python so it respects the timezone
+    recent_end_times = db.session.query(history.c.end_time)\
+        .filter(history.c.status == 'completed', in_window(history.c.end_time, window))
     
-    # Map results to days (fill zeros)
-    activity_map = {str(r[0]): r[1] for r in recent_activity}
-    bar_labels = []
-    bar_data = []
-    
-    for i in range(7):
-        day = seven_days_ago + timedelta(days=i)
-        bar_labels.append(day.strftime('%a')) # Mon, Tue...
-        bar_data.append(activity_map.get(str(day), 0))
+    bar_labels = [(seven_days_ago + timedelta(days=i)).strftime('%a') for i in range(7)] # Mon, Tue...
+    bar_data = bucket_by_local_day((r[0] for r in recent_end_times), user_tz, seven_days_ago, 7)
 
     return jsonify({
         'kpi': {'total': total, 'completed': completed, 'win_rate': win_rate},
@@ -237,12 +250,20 @@ def get_stats():
         'bar': {'labels': bar_labels, 'data': bar_data}
     })
 
+@api_bp.route('/api/stats/history', methods=['GET'])
+@login_required
+@read_only
+def get_history_stats():
+    # 365-day heatmap, streaks and per-category trends (past days cached per user/day)
+    return jsonify(history_stats(current_user))
+
 # ---------------------------------------------------------
 #  CATEGORY MANAGEMENT
 # ---------------------------------------------------------
 
 @api_bp.route('/api/categories', methods=['GET'])
 @login_required
+@read_only
 def get_categories_api():
     user_cats = Category.query.filter_by(user_id=current_user.id).all()
     results = []
@@ -274,6 +295,9 @@ def delete_category_api(cat_id):
     for goal in goals:
         goal.category_id = None
         
+    # Archived goals keep their category too
+    GoalArchive.query.filter_by(category_id=cat_id).update({'category_id': None})
+
     # 2. Uncategorize Patterns (Recurring Rules)
     patterns = RecurringPattern.query.filter_by(category_id=cat_id).all()
     for pattern in patterns:
@@ -316,15 +340,15 @@ def advance_status_api(goal_id):
                 elif pattern.frequency == 'monthly':
                     next_deadline += timedelta(days=30)
                 
-                new_goal = Goal(
-                    title=pattern.title,
-                    description=goal.description,
-                    deadline=next_deadline,
-                    user_id=current_user.id,
-                    pattern_id=pattern.id,
-                    category_id=goal.category_id
-                )
-                db.session.add(new_goal)
+                # No-op if this occurrence already exists (double click, retry, catch-up)
+                upsert_occurrences([{
+                    'title': pattern.title,
+                    'description': goal.description,
+                    'deadline': next_deadline,
+                    'user_id': current_user.id,
+                    'pattern_id': pattern.id,
+                    'category_id': goal.category_id
+                }])
 
     db.session.commit()
     return jsonify({'success': True})
@@ -344,6 +368,54 @@ def delete_goal_api(goal_id):
     db.session.commit()
     return jsonify({'success': True, 'id': goal.id})
 
+# ---------------------------------------------------------
+#  EXPORT & IMPORT (Streaming)
+# ---------------------------------------------------------
+
+@api_bp.route('/api/export', methods=['GET'])
+@login_required
+@read_only
+def export_goals_api():
+    export_format = request.args.get('format', 'ndjson')
+    if export_format not in ('ndjson', 'csv'):
+        return jsonify({'error': 'Format must be ndjson or csv'}), 400
+
+    # Rows are read in batches and written as they arrive, so memory stays flat
+    records = iter_export_records(current_user.id)
+    if export_format == 'csv':
+        body, mimetype = generate_csv(records), 'text/csv'
+    else:
+        body, mimetype = generate_ndjson(records), 'application/x-ndjson'
+
+    return Response(
+        stream_with_context(body),
+        mimetype=mimetype,
+        headers={'Content-Disposition': f'attachment; filename=goals.{export_format}'}
+    )
+
+@api_bp.route('/api/import', methods=['POST'])
+@login_required
+def import_goals_api():
+    import_format = request.args.get('format')
+    if not import_format:
+        import_format = 'csv' if request.mimetype == 'text/csv' else 'ndjson'
+    if import_format not in ('ndjson', 'csv'):
+        return jsonify({'error': 'Format must be ndjson or csv'}), 400
+
+    # Read the body line by line instead of loading it all
+    if import_format == 'csv':
+        records = iter_csv(request.stream)
+    else:
+        records = iter_ndjson(request.stream)
+
+    try:
+        summary = GoalImporter(current_user.id).run(records)
+    except UnicodeDecodeError:
+        db.session.rollback()
+        return jsonify({'error': 'File must be UTF-8 encoded'}), 400
+
+    return jsonify({'success': True, **summary})
+
 # ---------------------------------------------------------
 #  AI CHAT ENDPOINT
 # ---------------------------------------------------------
@@ -397,12 +469,26 @@ def chat_with_ai():
 
         full_prompt = f"{system_instruction}\n\nUser: {user_message}"
 
-        response = client.models.generate_content(
-            model='gemini-2.5-flash',
-            contents=full_prompt
-        )
+        def ask_gemini():
+            response = client.models.generate_content(
+                model='gemini-2.5-flash',
+                contents=full_prompt
+            )
+            return response.text
+
+        # Resent copies of the same question share one upstream call
+        flight_key = (current_user.id, goal.id, user_message.strip())
+        reply = ai_guard.call(current_user.id, flight_key, ask_gemini)
         
-        return jsonify({'reply': response.text})
+        return jsonify({'reply': reply})
+
+    except RateLimited as e:
+        response = jsonify({'error': 'Too many AI requests. Please wait a moment and try again.'})
+        response.headers['Retry-After'] = str(int(e.retry_after) + 1)
+        return response, 429
+
+    except UpstreamBusy:
+        return jsonify({'error': 'The AI helper is busy right now. Please try again shortly.'}), 503
 
     except Exception as e:
         print(f"AI Error: {e}")
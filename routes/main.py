@@ -33,17 +33,33 @@ def dashboard():
     )
 
     user_goals = pagination.items
-    user_categories = Category.query.filter_by(user_id=current_user.id).all()
 
     return render_template('dashboard.html', 
                            goals=user_goals,
                            pagination=pagination,
                            now=datetime.now(timezone.utc), 
-                           categories=user_categories,
                            selected_category=category_id,
                            selected_status=status, 
                            search_query=search_query,
-                           sort_by=sort_by)
+                           sort_by=sort_by,
+                           **dashboard_fragments())
+
+@main_bp.route("/dashboard/shell")
+@login_required
+def dashboard_shell():
+    # Lightweight variant: no goal queries, the page fetches its data from /api/*
+    check_recurring_goals(current_user)
+    return render_template('dashboard.html', **dashboard_fragments())
+
+def dashboard_fragments():
+    """
+    Context for the cached fragments of dashboard.html.
+    `categories` is a lazy query, so it only runs when the fragment cache misses.
+    """
+    return {
+        'categories': Category.query.filter_by(user_id=current_user.id),
+        'categories_version': Category.version_for(current_user.id)
+    }
 
 @main_bp.route("/analytics")
 @login_required
@@ -98,8 +114,18 @@ def edit_goal(goal_id):
             if aware_dt.date() < user_now.date():
                  flash("Deadline cannot be in a past day!", "danger")
                  return render_template("edit_goal.html", goal=goal, categories=categories)
-            
-            goal.deadline = aware_dt
+
+            new_deadline = aware_dt.astimezone(timezone.utc)
+            # A pattern has at most one occurrence per deadline (uq_goal_pattern_deadline)
+            if goal.pattern_id and Goal.query.filter(
+                Goal.pattern_id == goal.pattern_id,
+                Goal.deadline == new_deadline,
+                Goal.id != goal.id
+            ).first():
+                 flash("This recurring goal already has an occurrence at that time!", "danger")
+                 return render_template("edit_goal.html", goal=goal, categories=categories)
+
+            goal.deadline = new_deadline
         else:
             goal.deadline = None
 
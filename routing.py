@@ -0,0 +1,62 @@
+import time
+from functools import wraps
+from flask import g, session, has_request_context
+from flask_sqlalchemy.session import Session
+from sqlalchemy import event
+
+REPLICA_BIND = 'replica'
+
+class RoutingSession(Session):
+    """
+    Sends SELECTs from read-only endpoints to the replica engine (if one is
+    configured); flushes, INSERT/UPDATE/DELETE and everything else use the primary.
+    """
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and _replica_reads_enabled() and not self._flushing:
+            if clause is None or getattr(clause, 'is_select', False):
+                replica = self._db.engines.get(REPLICA_BIND)
+                if replica is not None:
+                    return replica
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+def _replica_reads_enabled():
+    return has_request_context() and g.get('use_replica', False)
+
+def read_only(view):
+    """
+    Marks an endpoint as read-only so its queries may go to the replica.
+    A user who wrote something in the last REPLICA_STICKY_SECONDS keeps reading
+    from the primary, so they always see their own changes.
+    """
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        g.use_replica = session.get('read_primary_until', 0) <= time.time()
+        return view(*args, **kwargs)
+    return wrapper
+
+def _mark_write():
+    if has_request_context():
+        g.db_wrote = True
+
+def init_routing(app):
+    """Tracks writes per request and makes the writer sticky to the primary."""
+    if REPLICA_BIND not in app.config.get('SQLALCHEMY_BINDS', {}):
+        return
+
+    @event.listens_for(RoutingSession, 'after_flush')
+    def after_flush(db_session, flush_context):
+        if db_session.new or db_session.dirty or db_session.deleted:
+            _mark_write()
+
+    @event.listens_for(RoutingSession, 'do_orm_execute')
+    def on_execute(orm_execute_state):
+        # Bulk INSERT / UPDATE / DELETE statements bypass the flush
+        if orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete:
+            _mark_write()
+
+    @app.after_request
+    def stick_to_primary(response):
+        if g.get('db_wrote'):
+            session['read_primary_until'] = time.time() + app.config['REPLICA_STICKY_SECONDS']
+        return response
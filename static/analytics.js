@@ -2,9 +2,11 @@
 function analyticsApp() {
     return {
         stats: null,
+        history: null,
         charts: {},
 
         async initStats() {
+            this.loadHistory();
             try {
                 const res = await fetch('/api/stats');
                 this.stats = await res.json();
@@ -12,6 +14,36 @@ function analyticsApp() {
             } catch (e) { console.error("Error:", e); }
         },
 
+        // Loaded on its own so a failure here never blanks the main charts
+        async loadHistory() {
+            try {
+                const res = await fetch('/api/stats/history');
+                if (res.ok) this.history = await res.json();
+            } catch (e) { console.error("Error:", e); }
+        },
+
+        // Heatmap cells, padded so the first column starts on Sunday
+        heatmapCells() {
+            if (!this.history) return [];
+            const start = new Date(this.history.heatmap.start + 'T00:00:00');
+            const cells = Array.from({ length: start.getDay() }, (_, i) => ({ key: `pad-${i}`, level: -1 }));
+
+            this.history.heatmap.counts.forEach((count, i) => {
+                const day = new Date(start);
+                day.setDate(start.getDate() + i);
+                cells.push({
+                    key: i,
+                    title: `${day.toDateString()}: ${count} completed`,
+                    level: count === 0 ? 0 : count < 2 ? 1 : count < 4 ? 2 : 3
+                });
+            });
+            return cells;
+        },
+
+        heatmapColor(level) {
+            return ['#ebedf0', '#9be9a8', '#40c463', '#216e39'][level] || 'transparent';
+        },
+
         renderCharts() {
             const getStatusColors = (labels) => {
                 return labels.map(label => {
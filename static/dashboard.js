@@ -3,6 +3,7 @@
 function dashboardApp() {
     return {
         goals: [],
+        legend: null,
         isLoading: true,
         isSubmitting: false,
         
@@ -60,6 +61,11 @@ function dashboardApp() {
             document.body.style.overflow = 'auto'; 
         },
 
+        editUrl(goal) {
+            if (!goal || !this.legend) return '#';
+            return this.legend.edit_url.replace('{id}', goal.id);
+        },
+
         // --- FETCHING ---
         async fetchGoals() {
             this.isLoading = true;
@@ -70,7 +76,9 @@ function dashboardApp() {
 
             try {
                 const response = await fetch(url);
-                this.goals = await response.json();
+                const data = await response.json();
+                this.legend = data.legend;
+                this.goals = data.goals;
             } catch (error) {
                 console.error("Error fetching goals:", error);
             } finally {
@@ -264,8 +272,11 @@ function dashboardApp() {
                 // Heatmap Logic
                 events: async function(info, successCallback, failureCallback) {
                     try {
-                        const response = await fetch('/api/goals'); 
-                        const allGoals = await response.json();
+                        // Only the visible range; the server turns local dates into UTC bounds
+                        const start = info.startStr.split('T')[0];
+                        const end = info.endStr.split('T')[0];
+                        const response = await fetch(`/api/goals?start=${start}&end=${end}`); 
+                        const allGoals = (await response.json()).goals;
                         
                         const activeCounts = {}; 
                         const hasCompleted = {};
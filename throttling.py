@@ -0,0 +1,140 @@
+import threading
+import time
+
+class RateLimited(Exception):
+    """The caller has used up their tokens; `retry_after` is in seconds."""
+    def __init__(self, retry_after):
+        super().__init__(f"Rate limited, retry after {retry_after:.1f}s")
+        self.retry_after = retry_after
+
+class UpstreamBusy(Exception):
+    """Every upstream slot stayed taken for longer than we are willing to wait."""
+
+class _Flight:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+class SingleFlight:
+    """
+    Concurrent calls with the same key share one execution:
+    the first caller runs the function, the others wait for its result (or error).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._flights = {}
+
+    def do(self, key, fn):
+        with self._lock:
+            flight = self._flights.get(key)
+            is_leader = flight is None
+            if is_leader:
+                flight = self._flights[key] = _Flight()
+
+        if not is_leader:
+            flight.done.wait()
+            if flight.error:
+                raise flight.error
+            return flight.result
+
+        try:
+            flight.result = fn()
+            return flight.result
+        except Exception as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._flights[key]
+            flight.done.set()
+
+class TokenBucketLimiter:
+    """
+    Per-key token bucket with queued admission.
+    A caller that finds the bucket empty reserves the next token and sleeps
+    until it is due, as long as that is within `max_wait` seconds; otherwise
+    it is rejected. Reservations push the balance negative, so queued callers
+    are admitted in arrival order.
+    """
+
+    def __init__(self, rate, capacity, max_wait):
+        self.rate = rate            # tokens per second
+        self.capacity = capacity    # burst size
+        self.max_wait = max_wait
+        self._lock = threading.Lock()
+        self._buckets = {}          # key -> (tokens, last_update)
+
+    def acquire(self, key):
+        """Blocks until admitted. Returns 0 when admitted, else the suggested retry delay."""
+        with self._lock:
+            now = time.monotonic()
+            tokens, updated = self._buckets.get(key, (self.capacity, now))
+            tokens = min(self.capacity, tokens + (now - updated) * self.rate) - 1
+            wait = -tokens / self.rate if tokens < 0 else 0
+
+            if wait > self.max_wait:
+                return wait - self.max_wait
+            self._buckets[key] = (tokens, now)
+            self._prune(now)
+
+        if wait:
+            time.sleep(wait)
+        return 0
+
+    def _prune(self, now):
+        # Drop buckets that have refilled completely; they behave like new ones
+        if len(self._buckets) > 10000:
+            self._buckets = {
+                key: (tokens, updated) for key, (tokens, updated) in self._buckets.items()
+                if tokens + (now - updated) * self.rate < self.capacity
+            }
+
+class AICallGuard:
+    """
+    Protects the upstream AI API:
+    1. identical in-flight requests share one upstream call,
+    2. each user gets a token bucket (short bursts are queued, long ones rejected),
+    3. a global semaphore caps concurrent upstream calls,
+    4. at most AI_MAX_CONCURRENCY + AI_MAX_WAITING requests may be inside the guard
+       at once (running, queued or waiting on a coalesced call); the rest are
+       turned away immediately, so AI traffic never holds more than that many
+       worker threads.
+    """
+
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.flights = SingleFlight()
+        self.limiter = TokenBucketLimiter(
+            rate=app.config['AI_RATE_PER_MINUTE'] / 60,
+            capacity=app.config['AI_BURST'],
+            max_wait=app.config['AI_MAX_QUEUE_WAIT']
+        )
+        self.slots = threading.BoundedSemaphore(app.config['AI_MAX_CONCURRENCY'])
+        self.slot_timeout = app.config['AI_MAX_QUEUE_WAIT']
+        self.admission = threading.BoundedSemaphore(app.config['AI_MAX_CONCURRENCY'] + app.config['AI_MAX_WAITING'])
+
+    def call(self, user_id, key, fn):
+        def guarded():
+            retry_after = self.limiter.acquire(user_id)
+            if retry_after:
+                raise RateLimited(retry_after)
+            if not self.slots.acquire(timeout=self.slot_timeout):
+                raise UpstreamBusy()
+            try:
+                return fn()
+            finally:
+                self.slots.release()
+
+        # Never block here: a full guard rejects right away instead of holding a thread
+        if not self.admission.acquire(blocking=False):
+            raise UpstreamBusy()
+        try:
+            # Followers of a coalesced request spend no tokens and take no slot
+            return self.flights.do(key, guarded)
+        finally:
+            self.admission.release()
@@ -0,0 +1,317 @@
+import csv
+import io
+import json
+from datetime import datetime, timezone
+from sqlalchemy import select
+from models import Goal, GoalArchive, Category, RecurringPattern
+from extensions import db
+from utils import upsert_occurrences
+
+# One flat schema for every record type so NDJSON and CSV share the same import path
+EXPORT_FIELDS = (
+    'type', 'id', 'name', 'title', 'description', 'status', 'frequency', 'anchor_date',
+    'is_active', 'deadline', 'start_time', 'end_time', 'date_created', 'category_id', 'pattern_id'
+)
+
+VALID_STATUSES = ('pending', 'in_progress', 'completed', 'archived')
+VALID_FREQUENCIES = ('daily', 'weekly', 'monthly')
+
+# Rows fetched per round-trip when exporting (server-side cursor on Postgres)
+EXPORT_BATCH_SIZE = 1000
+# Goals inserted per transaction when importing
+IMPORT_CHUNK_SIZE = 1000
+# Only the first few validation errors are reported back
+MAX_REPORTED_ERRORS = 50
+
+class RecordError(ValueError):
+    """A single import record failed validation."""
+
+# ---------------------------------------------------------
+#  EXPORT
+# ---------------------------------------------------------
+
+def _stream(statement):
+    """Executes a Core select in batches so only one batch is held in memory."""
+    result = db.session.execute(statement.execution_options(yield_per=EXPORT_BATCH_SIZE))
+    for row in result:
+        yield dict(row._mapping)
+
+def iter_export_records(user_id):
+    """
+    Yields the user's data as flat dicts: categories, then patterns, then goals
+    (hot and archived). Referenced rows always come before the rows that use them.
+    """
+    for row in _stream(select(Category.id, Category.name).where(Category.user_id == user_id).order_by(Category.id)):
+        yield {'type': 'category', **row}
+
+    pattern_columns = (
+        RecurringPattern.id, RecurringPattern.title, RecurringPattern.description,
+        RecurringPattern.frequency, RecurringPattern.anchor_date, RecurringPattern.is_active,
+        RecurringPattern.category_id
+    )
+    for row in _stream(select(*pattern_columns).where(RecurringPattern.user_id == user_id).order_by(RecurringPattern.id)):
+        yield {'type': 'pattern', **row}
+
+    for model, goal_id in ((Goal, Goal.id), (GoalArchive, GoalArchive.source_goal_id.label('id'))):
+        goal_columns = (
+            goal_id, model.title, model.description, model.status, model.deadline,
+            model.start_time, model.end_time, model.date_created, model.category_id, model.pattern_id
+        )
+        for row in _stream(select(*goal_columns).where(model.user_id == user_id).order_by(model.id)):
+            yield {'type': 'goal', **row}
+
+def _to_text(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return value
+
+def generate_ndjson(records):
+    for record in records:
+        yield json.dumps({key: _to_text(value) for key, value in record.items()}) + '\n'
+
+def generate_csv(records, flush_size=64 * 1024):
+    """Writes CSV rows into a small buffer and yields it whenever it fills up."""
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=EXPORT_FIELDS, extrasaction='ignore')
+    writer.writeheader()
+
+    for record in records:
+        writer.writerow({key: _to_text(value) for key, value in record.items()})
+        if buffer.tell() >= flush_size:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate(0)
+
+    if buffer.tell():
+        yield buffer.getvalue()
+
+# ---------------------------------------------------------
+#  IMPORT
+# ---------------------------------------------------------
+
+def iter_ndjson(stream):
+    """Yields (line_number, record) pairs from a binary NDJSON stream."""
+    for line_no, raw_line in enumerate(stream, start=1):
+        raw_line = raw_line.strip()
+        if not raw_line:
+            continue
+        try:
+            yield line_no, json.loads(raw_line)
+        except ValueError:
+            yield line_no, None
+
+def iter_csv(stream):
+    """Yields (line_number, record) pairs from a binary CSV stream."""
+    reader = csv.DictReader(line.decode('utf-8') for line in stream)
+    for record in reader:
+        yield reader.line_num, record
+
+def _blank(value):
+    return value is None or value == ''
+
+def _parse_datetime(record, field):
+    value = record.get(field)
+    if _blank(value):
+        return None
+    try:
+        return datetime.fromisoformat(value)
+    except (TypeError, ValueError):
+        raise RecordError(f"Invalid {field}")
+
+def _utc_timestamp(dt):
+    # Naive datetimes in an import file are UTC, like everything we store
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return dt.timestamp()
+
+def _parse_title(record, field='title', max_length=100):
+    title = str(record.get(field) or '').strip()
+    if not title:
+        raise RecordError(f"{field.title()} is required")
+    if len(title) > max_length:
+        raise RecordError(f"{field.title()} is longer than {max_length} characters")
+    return title
+
+def _map_reference(record, field, id_map):
+    """Translates an id from the import file into the id of the row we created."""
+    value = record.get(field)
+    if _blank(value):
+        return None
+    try:
+        return id_map[int(value)]
+    except (TypeError, ValueError, KeyError):
+        raise RecordError(f"Unknown {field} {value}")
+
+class GoalImporter:
+    """
+    Validates import records one at a time and bulk-inserts goals in chunks.
+    Only the category / pattern id maps are kept in memory, never the goals.
+    """
+
+    def __init__(self, user_id, chunk_size=IMPORT_CHUNK_SIZE):
+        self.user_id = user_id
+        self.chunk_size = chunk_size
+        self.pending_goals = []
+        self.category_map = {}
+        self.pattern_map = {}
+        self.summary = {'categories': 0, 'patterns': 0, 'goals': 0, 'skipped': 0, 'errors': 0, 'error_details': []}
+
+        # Re-use existing categories with the same name instead of duplicating them
+        self.existing_categories = {
+            name: cat_id for cat_id, name in
+            db.session.execute(select(Category.id, Category.name).where(Category.user_id == user_id))
+        }
+        # Same for patterns, matched on (title, frequency, anchor_date), so re-imported
+        # occurrences keep their pattern_id and hit the occurrence unique index
+        self.existing_patterns = {
+            self._pattern_key(title, frequency, anchor_date): pattern_id
+            for pattern_id, title, frequency, anchor_date in db.session.execute(
+                select(RecurringPattern.id, RecurringPattern.title, RecurringPattern.frequency, RecurringPattern.anchor_date)
+                    .where(RecurringPattern.user_id == user_id)
+            )
+        }
+
+    def run(self, records):
+        for line_no, record in records:
+            try:
+                self.add(record)
+            except RecordError as e:
+                self._record_error(line_no, str(e))
+        self.flush()
+        return self.summary
+
+    def add(self, record):
+        if not isinstance(record, dict):
+            raise RecordError("Malformed record")
+
+        kind = record.get('type')
+        if kind == 'category':
+            self._add_category(record)
+        elif kind == 'pattern':
+            self._add_pattern(record)
+        elif kind == 'goal':
+            self._add_goal(record)
+        else:
+            raise RecordError(f"Unknown record type {kind!r}")
+
+    def _source_id(self, record):
+        try:
+            return int(record.get('id'))
+        except (TypeError, ValueError):
+            raise RecordError("Missing or invalid id")
+
+    def _add_category(self, record):
+        source_id = self._source_id(record)
+        name = _parse_title(record, field='name', max_length=50)
+
+        if name not in self.existing_categories:
+            category = Category(name=name, user_id=self.user_id)
+            db.session.add(category)
+            db.session.flush()
+            self.existing_categories[name] = category.id
+            self.summary['categories'] += 1
+
+        self.category_map[source_id] = self.existing_categories[name]
+
+    @staticmethod
+    def _pattern_key(title, frequency, anchor_date):
+        return title, frequency, _utc_timestamp(anchor_date)
+
+    def _add_pattern(self, record):
+        source_id = self._source_id(record)
+        frequency = record.get('frequency')
+        if frequency not in VALID_FREQUENCIES:
+            raise RecordError(f"Invalid frequency {frequency!r}")
+
+        anchor_date = _parse_datetime(record, 'anchor_date')
+        if not anchor_date:
+            raise RecordError("anchor_date is required")
+
+        is_active = record.get('is_active', True)
+        if isinstance(is_active, str):
+            is_active = is_active.strip().lower() not in ('false', '0', '')
+
+        title = _parse_title(record)
+        key = self._pattern_key(title, frequency, anchor_date)
+        if key in self.existing_patterns:
+            self.pattern_map[source_id] = self.existing_patterns[key]
+            return
+
+        pattern = RecurringPattern(
+            title=title,
+            description=record.get('description') or None,
+            frequency=frequency,
+            anchor_date=anchor_date,
+            is_active=is_active,
+            user_id=self.user_id,
+            category_id=_map_reference(record, 'category_id', self.category_map)
+        )
+        db.session.add(pattern)
+        db.session.flush()
+        self.existing_patterns[key] = pattern.id
+        self.pattern_map[source_id] = pattern.id
+        self.summary['patterns'] += 1
+
+    def _add_goal(self, record):
+        status = record.get('status') or 'pending'
+        if status not in VALID_STATUSES:
+            raise RecordError(f"Invalid status {status!r}")
+
+        goal = {
+            'title': _parse_title(record),
+            'description': record.get('description') or None,
+            'status': status,
+            'deadline': _parse_datetime(record, 'deadline'),
+            'start_time': _parse_datetime(record, 'start_time'),
+            'end_time': _parse_datetime(record, 'end_time'),
+            'user_id': self.user_id,
+            'category_id': _map_reference(record, 'category_id', self.category_map),
+            'pattern_id': _map_reference(record, 'pattern_id', self.pattern_map)
+        }
+        date_created = _parse_datetime(record, 'date_created')
+        if date_created:
+            goal['date_created'] = date_created
+
+        self.pending_goals.append(goal)
+        if len(self.pending_goals) >= self.chunk_size:
+            self.flush()
+
+    def flush(self):
+        """Inserts the buffered goals in one statement and commits the chunk."""
+        if self.pending_goals:
+            # The unique index only covers the hot table, so occurrences already
+            # in cold storage are dropped here
+            archived = self._archived_occurrences(self.pending_goals)
+            goals = [
+                g for g in self.pending_goals
+                if not (g['pattern_id'] and g['deadline'] and (g['pattern_id'], _utc_timestamp(g['deadline'])) in archived)
+            ]
+
+            # Same upsert path as the recurrence engine: re-imported recurring occurrences
+            # are skipped, one-off goals (no pattern_id) are always appended
+            inserted = upsert_occurrences(goals)
+            self.summary['goals'] += len(inserted)
+            self.summary['skipped'] += len(self.pending_goals) - len(inserted)
+            self.pending_goals = []
+        db.session.commit()
+
+    def _archived_occurrences(self, goals):
+        """(pattern_id, deadline timestamp) of the chunk's occurrences that already live in goal_archive."""
+        occurrences = [(g['pattern_id'], g['deadline']) for g in goals if g['pattern_id'] and g['deadline']]
+        if not occurrences:
+            return set()
+
+        deadlines = [d for _, d in occurrences]
+        rows = db.session.execute(
+            select(GoalArchive.pattern_id, GoalArchive.deadline).where(
+                GoalArchive.user_id == self.user_id,
+                GoalArchive.pattern_id.in_({p for p, _ in occurrences}),
+                GoalArchive.deadline.between(min(deadlines, key=_utc_timestamp), max(deadlines, key=_utc_timestamp))
+            )
+        )
+        return {(pattern_id, _utc_timestamp(deadline)) for pattern_id, deadline in rows}
+
+    def _record_error(self, line_no, message):
+        self.summary['errors'] += 1
+        if len(self.summary['error_details']) < MAX_REPORTED_ERRORS:
+            self.summary['error_details'].append({'line': line_no, 'error': message})
@@ -1,7 +1,9 @@
 from datetime import datetime, timezone, timedelta
-from models import RecurringPattern, Goal
+from sqlalchemy import select, delete, func, case, inspect, Index
+from models import RecurringPattern, Goal, GoalReminder
 from extensions import db
-
+from archive import latest_occurrence
+from reminders import sync_goal_reminders
 def check_recurring_goals(user):
     """
     Checks the user's RecurringPatterns (The Rules).
@@ -15,18 +17,18 @@ def check_recurring_goals(user):
     ).all()
 
     now_utc = datetime.now(timezone.utc)
-    changes_made = False
+    occurrences = []
 
     for pattern in patterns:
         # 2. Find the LATEST goal created by this pattern to track the SEQUENCE
-        last_goal = Goal.query.filter_by(pattern_id=pattern.id)\
-            .order_by(Goal.deadline.desc()).first()
+        # (archived occurrences count too, otherwise the sequence would restart)
+        last_deadline = latest_occurrence(pattern.id)
             
-        if not last_goal:
+        if not last_deadline:
             # If no goals exist (e.g. user deleted them all), restart from the anchor date
             current_deadline_date = pattern.anchor_date
         else:
-            current_deadline_date = last_goal.deadline
+            current_deadline_date = last_deadline
 
         if not current_deadline_date: 
             continue
@@ -50,17 +52,78 @@ def check_recurring_goals(user):
             new_dt_combined = datetime.combine(current_deadline_date.date(), anchor_time)
 
             # Create the Product (The Task)
-            new_goal = Goal(
-                title=pattern.title,
-                description=pattern.description,
-                user_id=user.id,
-                category_id=pattern.category_id,
-                deadline=new_dt_combined,
-                pattern_id=pattern.id,
-                status='pending'
-            )
-            db.session.add(new_goal)
-            changes_made = True
-
-    if changes_made:
-        db.session.commit()
\ No newline at end of file
+            occurrences.append({
+                'title': pattern.title,
+                'description': pattern.description,
+                'user_id': user.id,
+                'category_id': pattern.category_id,
+                'deadline': new_dt_combined,
+                'pattern_id': pattern.id,
+                'status': 'pending'
+            })
+
+    # Safe to retry or run concurrently: existing occurrences are skipped
+    if occurrences:
+        upsert_occurrences(occurrences)
+        db.session.commit()
+
+def upsert_occurrences(rows):
+    """
+    Inserts goal rows with INSERT ... ON CONFLICT (pattern_id, deadline) DO NOTHING.
+    This is the single path for creating recurring occurrences, so double clicks,
+    retries and parallel workers never produce duplicates.
+    Returns the ids of the rows that were actually inserted.
+    """
+    if not rows:
+        return []
+
+    dialect = db.session.get_bind().dialect.name
+    if dialect == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert
+    elif dialect == 'sqlite':
+        from sqlalchemy.dialects.sqlite import insert
+    else:
+        raise NotImplementedError(f"Upsert is not supported on {dialect}")
+
+    statement = insert(Goal)\
+        .on_conflict_do_nothing(index_elements=['pattern_id', 'deadline'])\
+        .returning(Goal.id)
+    inserted_ids = db.session.scalars(statement, rows).all()
+
+    # Core inserts skip the ORM flush hooks, so index their reminders here
+    sync_goal_reminders(inserted_ids)
+    return inserted_ids
+
+OCCURRENCE_INDEX = 'uq_goal_pattern_deadline'
+
+def ensure_occurrence_index(batch_size=500):
+    """
+    Upgrades databases created before uq_goal_pattern_deadline existed (create_all
+    never alters tables): deletes duplicate (pattern_id, deadline) occurrences and
+    creates the unique index that upsert_occurrences relies on.
+    Of each duplicate group it keeps a completed goal if there is one, else the oldest.
+    Returns (removed duplicates, whether the index was created).
+    """
+    inspector = inspect(db.engine)
+    existing = {c['name'] for c in inspector.get_unique_constraints('goal')} | \
+               {i['name'] for i in inspector.get_indexes('goal')}
+    if OCCURRENCE_INDEX in existing:
+        return 0, False
+
+    rank = func.row_number().over(
+        partition_by=(Goal.pattern_id, Goal.deadline),
+        order_by=(case((Goal.status == 'completed', 0), else_=1), Goal.id)
+    ).label('rank')
+    ranked = select(Goal.id, rank)\
+        .where(Goal.pattern_id.isnot(None), Goal.deadline.isnot(None))\
+        .subquery()
+    duplicate_ids = db.session.scalars(select(ranked.c.id).where(ranked.c.rank > 1)).all()
+
+    for i in range(0, len(duplicate_ids), batch_size):
+        chunk = duplicate_ids[i:i + batch_size]
+        db.session.execute(delete(Goal).where(Goal.id.in_(chunk)))
+        db.session.execute(delete(GoalReminder).where(GoalReminder.goal_id.in_(chunk)))
+
+    Index(OCCURRENCE_INDEX, Goal.pattern_id, Goal.deadline, unique=True).create(db.session.connection())
+    db.session.commit()
+    return len(duplicate_ids), True